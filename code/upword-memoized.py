@@ -11,196 +11,586 @@
 #  SPDX-License-Identifier: MIT
 #
 
+import ctypes
+import itertools
 import math
+import os
 import random
+import shutil
+import signal
+import subprocess
+import tempfile
+
+# Numba is optional. Without it, the search just runs in plain Python.
+try:
+    import numba
+    import numpy
+except ImportError:
+    numba = None
 
 # --- Configurable Parameters -------------------------------------------------
 
-# The elements of @alphabet strings because you can't hash lists in Python, so
-# you can't memoize functions whose arguments include a list, so if we want to
-# use the current state of the upword as a key for our cache, we have to make 
-# it a string.
+# The elements of @alphabet are strings, one character each, so that upwords
+# can be written out as text. Internally, words get packed into integers (see
+# below) so that the search can work on them with bit operations.
 alphabet = ["0","1"]
 window_length = 8
 
 randomize_walk = False
 verbose_output = True
 
+# If there's a C compiler around, compile upword_search.c and run the search
+# in that. Otherwise, if Numba is installed, compile the search to machine
+# code with that. Both are much faster than the plain Python search, which
+# we fall back on if neither works out.
+use_native = True
+use_jit = True
+
 output_filename = "upwords.txt"
 
+# --- Packed Representation of Words ------------------------------------------
+
+# Hashing and slicing strings turns out to be where the search spends most of
+# its time, so windows of the word are packed into integers instead. Each
+# symbol takes up @symbol_bits bits: the elements of @alphabet get the codes
+# 0, 1, ... in order and the wildcard "w" gets the next code after that, so
+# for the binary alphabet "0", "1" and "w" are 0b00, 0b01 and 0b10. The most
+# recently added symbol goes in the lowest bits.
+#
+# The word as a whole is only needed once it turns out to be an upword, so it
+# is kept as a sequence of these codes (one per symbol) and only turned back
+# into a string then.
+symbol_bits = len(alphabet).bit_length()
+symbol_mask = (1 << symbol_bits) - 1
+symbol_code = {a: code for code, a in enumerate(alphabet)}
+symbol_code["w"] = len(alphabet)
+code_symbol = {code: a for a, code in symbol_code.items()}
+
+def decodeSymbols(codes):
+    """Turns the sequence of symbol codes @codes back into a string.
+    """
+    return "".join([code_symbol[code] for code in codes])
+
 # --- Class to Check for Repeated Subwords ------------------------------------
 
-class SubwordCache(object):
+class SubwordChecker(object):
     def __init__(self, alphabet, window_length):
-        self.mem_seenWords = {}
         self.alphabet = alphabet
         self.window_length = window_length
-        self.max_entries = 9000
-        
-    def coveredSubwords(self, word):
-        """For a given word, returns a set containing all the subwords that
-           appear in the word. Relies on global variables @window_length and
-           @alphabet and treats "w" as the wildcard character. Memoized by 
-           @mem_seenWords.
-        """
-        if len(word) < window_length:
-            return set()
 
-        if word not in self.mem_seenWords:
-            new_words = set()
-            last_word = word[-window_length:]
-            for a in alphabet:
-                new_words.add(last_word.replace("w", a))
-            self.mem_seenWords[word] = self.coveredSubwords(word[:-1]).union(new_words)
+        # Masks off the last @window_length symbols of a packed window.
+        self.window_mask = (1 << (symbol_bits * window_length)) - 1
 
-        return self.mem_seenWords[word]
+        # Per-field masks for finding wildcards in a whole window at once:
+        # the lowest bit of every field, the highest bit of every field, the
+        # bits below the highest one, and a window that's nothing but
+        # wildcards.
+        self.field_lows = self.window_mask // symbol_mask
+        self.field_highs = self.field_lows << (symbol_bits - 1)
+        self.field_rests = self.window_mask & ~self.field_highs
+        self.wild_window = self.field_lows * symbol_code["w"]
 
-    def size(self):
-        """Returns the number of entries in the cache.
-        """
-        return len(self.mem_seenWords)
-        
-    def setMaxEntries(self, entries):
-        """Sets the maximum number of entries in the cache. Each thousand 
-           entries use about 1GB of memory for the binary alphabet, n=8 
-           case.
-        """
-        self.max_entries = entries
-
-    # The memoization blows up the ram usage, so we'll prune the cache every
-    # so often. This is dark magic, so it'll take some profiling to determine
-    # whether intelligently pruning the cache is more expensive than just 
-    # blowing it away when it gets too big (for some value of too big).
-    def expire(self, current_stack):
-        """If the cache is too big, removes elements (but not the ones we still
-           need) until it's smaller.
+        # Each of the |@alphabet|**@window_length concrete windows (the ones
+        # without wildcards) gets its own bit, so the subwords covered by a
+        # word fit in a single integer bitmap. This maps packed windows to
+        # their bit.
+        self.window_bit = {}
+        for index, window in enumerate(itertools.product(range(len(alphabet)), repeat=window_length)):
+            packed = 0
+            for code in window:
+                packed = (packed << symbol_bits) | code
+            self.window_bit[packed] = 1 << index
+
+        # There are only (|@alphabet| + 1)**@window_length windows, wildcards
+        # and all, so rather than expanding the wildcards of every window we
+        # come across, we do it once per window. This maps each packed window
+        # to the bitmap of its concretizations, so one AND against a covered
+        # bitmap checks all of them at once. For long windows, building it
+        # for all of them up front would take gigabytes, so @subwords fills
+        # it in as windows turn up.
+        self.window_subwords = {}
+
+    def subwords(self, window):
+        """Returns the bitmap of the concretizations of the packed @window,
+           and remembers it in @window_subwords.
         """
-        if len(self.mem_seenWords) < self.max_entries:
-            return
-    
-        # We want to retain cache for the elements of the current processing
-        # stack *less their last character*.
-        truncated_keys = []
-        for key in current_stack:
-            truncated_keys.append(key[:-1])
-    
-        # You can't modify a dictionary while iterating over its keys, so we
-        # have to build a list of bad keys, and then iterate over those, which
-        # is slow, but better than making a copy of the cache, I think, because
-        # the list of bad keys will be shorter?
-        bad_keys = []
-        for key in self.mem_seenWords:
-            if not key in truncated_keys:
-                bad_keys.append(key)
-    
-        for key in bad_keys:
-            del self.mem_seenWords[key]
-
-    # This is recursive, so might blow the stack on *really* long upwords.
-    def hasRepeatedSubword(self, word):
-        """ Returns true if word covers a subword of size @window_length
-            for @alphabet more than once. Returns false otherwise. Recursive
-            and memoized.
+        subwords = 0
+        for concrete in self.concretizations(window):
+            subwords |= self.window_bit[concrete]
+        self.window_subwords[window] = subwords
+        return subwords
+
+    def concretizations(self, window):
+        """Returns a list of the packed @window with every wildcard replaced
+           by each symbol in @alphabet in turn.
         """
-        words = self.coveredSubwords(word[:-1])
-        for a in alphabet:
-            # Because we're pruning branches that duplicate words, we only
-            # have to look at the *last* position and see if any of the words
-            # created by the most recently added character appear more than
-            # once.
-            if word[-window_length:].replace("w", a) in words:
-                return True
-        return False
+        # Fields that match the wildcard are zero after the xor. Adding
+        # @field_rests carries into the high bit of every field that has a
+        # low bit set, without spilling into the next field, so the high bits
+        # left clear mark exactly the wildcards.
+        x = window ^ self.wild_window
+        nonzero = ((x & self.field_rests) + self.field_rests) | x
+        wild_fields = (~nonzero & self.field_highs) >> (symbol_bits - 1)
 
-# --- Main Program Starts Here ------------------------------------------------
+        concrete = window & ~(wild_fields * symbol_mask)
+        return [concrete | (wild_fields * symbol_code[a]) for a in alphabet]
 
-cache = SubwordCache(alphabet, window_length)
+# --- Compiled Search ---------------------------------------------------------
 
-# We can start the upword with the first symbol in @alphabet without loss of 
-# generality because alphabet rotations (bit flips in the binary case) produce
-# elements of an equivalence class of upwords. So for the binary alphabet, this
-# will find the half of the possible upwords that start with 0.
-first_candidate = alphabet[0]
+# This does the same depth first search as searchInterpreted below, but on
+# numpy arrays so that Numba can compile it. Only the last @window_length
+# symbols of a word matter for finding repeated subwords, so stack entries
+# hold just that window (packed the same way as above, which fits in an
+# int64), the symbol that was added, and the length of the word; the symbols
+# of the word we're currently looking at live in @path. Each row of
+# @stack_covered is the bitmap of covered subwords for that entry, split up
+# into uint64s.
+#
+# The kernel returns when @found might not have room for another node's worth
+# of upwords, so they can be written down, and picks up where it left off
+# when it's called again with the same stack.
+if numba is not None:
+    @numba.njit(cache=True)
+    def searchKernel(alphabet_size, window_length, target_length, symbol_bits,
+                     randomize_walk, verbose_output, order, stack_symbol,
+                     stack_length, stack_window, stack_covered, top, longest,
+                     path, found, budget):
+        wildcard = alphabet_size
+        symbol_mask = (1 << symbol_bits) - 1
+        window_mask = (1 << (symbol_bits * window_length)) - 1
+        covered = numpy.empty(stack_covered.shape[1], numpy.uint64)
+        children = numpy.empty(alphabet_size, numpy.int64)
+        new_indices = numpy.empty(alphabet_size, numpy.int64)
+        count = 0
+        nodes = 0
 
-# An upword for $\A^n$ is $|\A|^n + (n-1)$ characters long. 
-target_length = len(alphabet)**(window_length-1) + (window_length-1)
+        # We hand control back to searchCompiled whenever @found might fill up
+        # and every @budget nodes, so Python gets a chance to notice things
+        # like Ctrl-C.
+        while top > 0 and count + alphabet_size <= found.shape[0] and nodes < budget:
+            # Pushing children will overwrite this entry, so we copy out its
+            # bitmap first.
+            top -= 1
+            length = stack_length[top]
+            window = stack_window[top]
+            path[length - 1] = stack_symbol[top]
+            covered[:] = stack_covered[top]
+            nodes += 1
 
-if verbose_output:
-    print("Searching for universal partial words of length ", target_length)
+            # Printing is left to Python, so we put the node back and return.
+            # Since @longest is already up to date, we carry on with it next
+            # time.
+            if length > longest:
+                longest = length
+                if verbose_output:
+                    return top + 1, longest, count, True
 
-# Rather than a random walk down the tree, this is going to use a stack to
-# do a depth first search of the tree, favoring the lexicographically least 
-# available branch (as given by the order of the elements of @alphabet).
-# Note that if @randomize_walk is True, then this will take a random walk
-# down the tree instead.
-processing_stack = []
-processing_stack.append(first_candidate)
+            if length % window_length == window_length - 1:
+                children[0] = wildcard
+                num_children = 1
+            else:
+                if randomize_walk:
+                    numpy.random.shuffle(order)
+                children[:] = order
+                num_children = alphabet_size
 
-upwords = []
-longest = len(first_candidate)
+            for k in range(num_children):
+                c = children[k]
+                candidate = ((window << symbol_bits) | c) & window_mask
 
-# For some points in the parameter space, there are lots of upwords,
-# so let's write them down in a file.
-upword_list = open(output_filename, 'w')
+                # Work out the bit of each concretization of the new window,
+                # and skip the child if any of them were already covered.
+                repeated = False
+                num_new = 0
+                if length + 1 >= window_length:
+                    for a in range(alphabet_size):
+                        index = 0
+                        place = 1
+                        rest = candidate
+                        for i in range(window_length):
+                            symbol = rest & symbol_mask
+                            if symbol == wildcard:
+                                symbol = a
+                            index += symbol * place
+                            place *= alphabet_size
+                            rest >>= symbol_bits
+                        if covered[index >> 6] & (numpy.uint64(1) << numpy.uint64(index & 63)):
+                            repeated = True
+                            break
+                        new_indices[num_new] = index
+                        num_new += 1
+                if repeated:
+                    continue
+
+                if length + 1 == target_length:
+                    path[length] = c
+                    found[count, :] = path
+                    count += 1
+                else:
+                    stack_symbol[top] = c
+                    stack_length[top] = length + 1
+                    stack_window[top] = candidate
+                    stack_covered[top, :] = covered
+                    for j in range(num_new):
+                        index = new_indices[j]
+                        stack_covered[top, index >> 6] |= numpy.uint64(1) << numpy.uint64(index & 63)
+                    top += 1
+
+        return top, longest, count, False
+
+def searchCompiled(first_symbol):
+    """Runs the search with @searchKernel, starting from the word made up of
+       just @first_symbol, and records the upwords it finds.
+    """
+    # Each node we pop pushes at most |@alphabet| children, so the stack never
+    # holds more than that many entries per level of the tree.
+    capacity = len(alphabet) * target_length
+    bitmap_words = (len(alphabet)**window_length + 63) // 64
+
+    stack_symbol = numpy.zeros(capacity, numpy.int64)
+    stack_length = numpy.zeros(capacity, numpy.int64)
+    stack_window = numpy.zeros(capacity, numpy.int64)
+    stack_covered = numpy.zeros((capacity, bitmap_words), numpy.uint64)
+
+    stack_symbol[0] = symbol_code[first_symbol]
+    stack_length[0] = 1
+    stack_window[0] = symbol_code[first_symbol]
+    # With one symbol windows, the first symbol is already a whole window, so
+    # it covers a subword of its own.
+    if window_length == 1:
+        code = symbol_code[first_symbol]
+        stack_covered[0, code >> 6] = numpy.uint64(1) << numpy.uint64(code & 63)
+    top = 1
+    longest = 0
+
+    order = numpy.array([symbol_code[a] for a in alphabet], numpy.int64)
+    path = numpy.zeros(target_length, numpy.int64)
+    found = numpy.zeros((1024, target_length), numpy.int64)
+    budget = 2**24
+
+    while top > 0:
+        top, longest, count, report = searchKernel(len(alphabet), window_length,
+                                                   target_length, symbol_bits,
+                                                   randomize_walk, verbose_output,
+                                                   order, stack_symbol,
+                                                   stack_length, stack_window,
+                                                   stack_covered, top, longest,
+                                                   path, found, budget)
+        for row in found[:count].tolist():
+            recordUpword(decodeSymbols(row))
+        # The node that got longer than @longest is back on top of the stack.
+        if report:
+            print(top - 1, longest)
+
+# --- Native Search -----------------------------------------------------------
 
-while len(processing_stack) > 0:
-    # Grab the top element of the stack and process it.
-    word = processing_stack.pop()
+# The search in upword_search.c reports each upword it finds (as symbol
+# codes) through one callback and checks in through the other, either of
+# which can return nonzero to stop the search.
+UPWORD_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(ctypes.c_ubyte), ctypes.c_int)
+PROGRESS_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_long, ctypes.c_int)
 
-    if (len(word) >= longest):
-        longest = len(word)
+def loadNativeKernel():
+    """Compiles upword_search.c (which lives next to this script) into a
+       shared library and loads it. Returns None if that doesn't work out,
+       e.g. if there's no C compiler, and says why if @verbose_output is set.
+    """
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "upword_search.c")
+    compiler = os.environ.get("CC", "cc")
+
+    build_dir = None
+    try:
+        build_dir = tempfile.mkdtemp()
+        library = os.path.join(build_dir, "upword_search.so")
+        subprocess.run([compiler, "-O3", "-march=native", "-shared", "-fPIC",
+                        "-o", library, source],
+                       check=True, capture_output=True)
+        kernel = ctypes.CDLL(library)
+    except subprocess.CalledProcessError as error:
+        if verbose_output:
+            print(f"Couldn't compile {source} with {compiler}:")
+            print(error.stderr.decode(errors="replace"), end="")
+        return None
+    except OSError as error:
         if verbose_output:
-            print(len(processing_stack), cache.size(), longest)
+            print(f"Couldn't build {source} with {compiler}: {error}")
+        return None
+    finally:
+        # Once it's loaded, we don't need the library file any more. Whether
+        # it can be removed (it can't, on some systems, while it's loaded)
+        # doesn't change anything, so we don't mind if that fails.
+        if build_dir is not None:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    kernel.search.restype = ctypes.c_long
+    kernel.search.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                              ctypes.c_int, ctypes.c_int, ctypes.c_uint32,
+                              ctypes.c_int, UPWORD_CALLBACK, PROGRESS_CALLBACK]
+    return kernel
+
+def searchNative(kernel, first_symbol):
+    """Runs the search with the search() function from @kernel (as loaded by
+       loadNativeKernel), starting from the word made up of just
+       @first_symbol, and records the upwords it finds.
+    """
+    # ctypes can't pass exceptions back up through C, so the callbacks hang
+    # on to them and stop the search instead, and we raise them again once it
+    # returns. Ctrl-C would raise a KeyboardInterrupt as soon as a callback
+    # starts, before it could catch it, so while the search runs we handle
+    # that with a flag instead.
+    errors = []
+    interrupted = False
+    longest = 0
+
+    def interrupt(signum, frame):
+        nonlocal interrupted
+        interrupted = True
+
+    def foundUpword(codes, length):
+        try:
+            recordUpword(decodeSymbols(codes[:length]))
+        except BaseException as e:
+            errors.append(e)
+        return interrupted or bool(errors)
+
+    def reportProgress(top, length):
+        nonlocal longest
+        try:
+            if length > longest:
+                longest = length
+                if verbose_output:
+                    print(top, longest)
+        except BaseException as e:
+            errors.append(e)
+        return interrupted or bool(errors)
+
+    handle_interrupts = signal.getsignal(signal.SIGINT) is signal.default_int_handler
+    if handle_interrupts:
+        signal.signal(signal.SIGINT, interrupt)
+    try:
+        result = kernel.search(len(alphabet), window_length, target_length,
+                               symbol_code[first_symbol], randomize_walk,
+                               random.getrandbits(32), verbose_output,
+                               UPWORD_CALLBACK(foundUpword),
+                               PROGRESS_CALLBACK(reportProgress))
+    finally:
+        if handle_interrupts:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    if errors:
+        raise errors[0]
+    if interrupted:
+        raise KeyboardInterrupt
+    if result < 0:
+        raise MemoryError("couldn't allocate the search stack")
+
+# --- Plain Python Search -----------------------------------------------------
+
+def searchInterpreted(first_symbol):
+    """Runs the search in plain Python, starting from the word made up of
+       just @first_symbol, and records the upwords it finds.
+    """
+    # This loop runs once for every node in the tree, so everything it uses
+    # gets pulled into a local variable first. CPython looks up locals by
+    # index, but globals and attributes by name, every single time.
+    wl = window_length
+    tl = target_length
+    bits = symbol_bits
+    verbose = verbose_output
+    randomize = randomize_walk
+    shuffle = random.shuffle
+    checker = SubwordChecker(alphabet, window_length)
+    window_subwords = checker.window_subwords
+    subwords = checker.subwords
+    window_mask = checker.window_mask
+    mask = symbol_mask
+    decode = decodeSymbols
+    record = recordUpword
+
+    # Rather than a random walk down the tree, this is going to use a stack
+    # to do a depth first search of the tree, favoring the lexicographically
+    # least available branch (as given by the order of the elements of
+    # @alphabet). Note that if @randomize_walk is True, then this will take a
+    # random walk down the tree instead.
+    #
+    # Each entry on the stack is the packed last window of a word, the
+    # word's length, and the bitmap of the subwords it covers. Since we
+    # always see a parent before its children, a child's bitmap is just its
+    # parent's plus whatever its last window adds, so there's nothing to
+    # recompute (or cache) as we go down the tree.
+    #
+    # For the same reason, the word itself doesn't have to be on the stack:
+    # by the time we pop an entry, @path already holds the symbols of its
+    # parent, so we only need to write down its own last symbol.
+    #
+    # Each node we pop pushes at most |@alphabet| children, so the stack never
+    # holds more than that many entries per level of the tree. We allocate all
+    # of it up front and keep track of the top ourselves, so the lists never
+    # have to grow. The three parts of each entry go in three parallel lists,
+    # which saves building (and unpacking) a tuple for every node.
+    capacity = len(alphabet) * tl
+    stack_window = [0] * capacity
+    stack_length = [0] * capacity
+    stack_covered = [0] * capacity
+    stack_window[0] = symbol_code[first_symbol]
+    stack_length[0] = 1
+    # With one symbol windows, the first symbol is already a whole window, so
+    # it covers a subword of its own.
+    if 1 >= wl:
+        stack_covered[0] = subwords(stack_window[0])
+    top = 1
+    path = bytearray(tl)
 
     # If we're on a wildcard node, add that. Otherwise, add a speculative node
-    # for each character in the alphabet. This bakes in a diamondicity of 1, 
-    # with the wildcard appearing as the last character of each frame. If we 
-    # want a bigger diamondicity, we could turn this into a function that 
-    # returns the next set of symbols based on that logic.    
-    if len(word) % window_length == window_length - 1:
-        next_symbols = ['w']
-    else:
-        # This turns out to be rather expensive, but mixes up the order 
-        # we traverse the tree. If we want the program to be strictly 
-        # deterministic, we can comment out this line.
+    # for each character in the alphabet. This bakes in a diamondicity of 1,
+    # with the wildcard appearing as the last character of each frame. If we
+    # want a bigger diamondicity, we could change how this table gets built.
+    #
+    # Which symbols come next only depends on the length of the word, so we
+    # work them out (as symbol codes) for every length up front rather than
+    # taking a modulus at every node. Every non-wildcard length shares the
+    # same @alphabet_codes list, so shuffling it shuffles all of them. The
+    # first word is already as long as the target if @window_length is 1, so
+    # the table goes up to @tl.
+    alphabet_codes = [symbol_code[a] for a in alphabet]
+    wildcard_codes = [symbol_code["w"]]
+    next_symbols_at = []
+    for length in range(tl + 1):
+        if length % wl == wl - 1:
+            next_symbols_at.append(wildcard_codes)
+        else:
+            next_symbols_at.append(alphabet_codes)
+
+    longest = 0
+
+    while top:
+        # Grab the top element of the stack and process it.
+        top -= 1
+        window = stack_window[top]
+        length = stack_length[top]
+        covered = stack_covered[top]
+        path[length - 1] = window & mask
+
+        if length > longest:
+            longest = length
+            if verbose:
+                print(top, longest)
+
+        next_symbols = next_symbols_at[length]
+
+        # This turns out to be rather expensive, but mixes up the order we
+        # traverse the tree. If we want the program to be strictly
+        # deterministic, we can set @randomize_walk to False.
         # Are there probabilistic things that could help order this?
-        if randomize_walk:
-            random.shuffle(alphabet) 
-        
-        next_symbols = alphabet
-
-    # A node is a leaf node is it has not children that could potentially
-    # be upwords. (i.e. if every one of its potential children has a repeated
-    # subword. Leaf nodes don't add any elements to the processing queue.)
-    isLeafNode = True
-    for c in next_symbols:
-        candidate = word + c
-
-        # We don't need to add the children of @word if they repeat seen
-        # windows, because they will never have a child that is an upword.
-        if cache.hasRepeatedSubword(candidate):
-            continue
-
-        isLeafNode = False
-        if len(candidate) == target_length:
-            # We found one! Actually this just means that we've found a 
-            # word that's the right length and doesn't *double* cover anything.
-            # We need to check the results to make sure they cover all the
-            # possible words, which they might not if our wildcard rules are
-            # too restrictive.
-            upwords.append(candidate)
+        if randomize and next_symbols is alphabet_codes:
+            shuffle(alphabet_codes)
+
+        for code in next_symbols:
+            candidate = ((window << bits) | code) & window_mask
+
+            # We don't need to add the children of this word if they repeat
+            # seen windows, because they will never have a child that is an
+            # upword. Because we're pruning branches that duplicate words, we
+            # only have to look at the *last* position and see if any of the
+            # words created by the most recently added character were already
+            # covered. The bits for those words also go into the child's
+            # bitmap, so we work them out right here.
+            if length + 1 >= wl:
+                new_words = window_subwords.get(candidate)
+                if new_words is None:
+                    new_words = subwords(candidate)
+                if new_words & covered:
+                    continue
+            else:
+                new_words = 0
+
+            if length + 1 == tl:
+                # We found one! Actually this just means that we've found a 
+                # word that's the right length and doesn't *double* cover
+                # anything. We need to check the results to make sure they
+                # cover all the possible words, which they might not if our
+                # wildcard rules are too restrictive.
+                path[length] = code
+                record(decode(path))
+            else:
+                # Not long enough yet, so we'll put it on the stack to add
+                # children and process more.
+                stack_window[top] = candidate
+                stack_length[top] = length + 1
+                stack_covered[top] = covered | new_words
+                top += 1
+
+# --- Main Program Starts Here ------------------------------------------------
+
+# An upword for $\A^n$ is $|\A|^n + (n-1)$ characters long. 
+target_length = len(alphabet)**(window_length-1) + (window_length-1)
+
+upwords = []
+
+# For some points in the parameter space, there are lots of upwords,
+# so let's write them down in a file, which main() opens. We write them in
+# batches rather than one at a time, since there can be a lot of them.
+upword_list = None
+upword_batch = []
+
+def recordUpword(upword):
+    """Keeps track of a newly found upword and writes it down.
+    """
+    upwords.append(upword)
+
+    # For some points in the parameter space, upwords turn up far faster than
+    # anyone could read them, and printing every one of them slows the search
+    # down, so we only mention the first one and every 256th after that.
+    if verbose_output and (len(upwords) - 1) % 256 == 0:
+        print(f"Found upword #{len(upwords)}: {upword}")
+    upword_batch.append(upword)
+    if len(upword_batch) >= 4096:
+        flushUpwords()
+
+def flushUpwords():
+    """Writes the upwords in @upword_batch to the file and empties it.
+    """
+    if upword_batch:
+        upword_list.write("\n".join(upword_batch) + "\n")
+        upword_batch.clear()
+
+def main():
+    global upword_list
+
+    if verbose_output:
+        print("Searching for universal partial words of length ", target_length)
+
+    upword_list = open(output_filename, 'w', buffering=1 << 20)
+
+    # Searches can run for a long time, so make sure the last batch gets
+    # written down even if this one gets interrupted.
+    try:
+        # We can start the upword with the first symbol in @alphabet without
+        # loss of generality because alphabet rotations (bit flips in the
+        # binary case) produce elements of an equivalence class of upwords.
+        # So for the binary alphabet, this will find the half of the possible
+        # upwords that start with 0.
+        #
+        # The native and compiled searches pack windows into 64 bit
+        # integers, so they can only handle windows that fit.
+        fits = symbol_bits * window_length < 63
+        kernel = loadNativeKernel() if use_native and fits else None
+
+        if kernel is not None:
+            if verbose_output:
+                print("Using the native search")
+            searchNative(kernel, alphabet[0])
+        elif use_jit and numba is not None and fits:
             if verbose_output:
-                print("Found upword #", len(words),": ", candidate)
-            upword_list.write(candidate)
-            upword_list.write("\n")
+                print("Using the Numba search")
+            searchCompiled(alphabet[0])
         else:
-            # Not long enough yet, so we'll put it on the stack to add
-            # children and process more.
-            processing_stack.append(candidate)
-
-    # When we hit a leaf node, we'll prune the cache. In practice, this hits
-    # enough to keep the cache from blowing up.
-    if isLeafNode:
-        cache.expire(processing_stack)
+            if verbose_output:
+                print("Using the interpreted search")
+            searchInterpreted(alphabet[0])
+    finally:
+        flushUpwords()
+        upword_list.close()
 
-upword_list.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
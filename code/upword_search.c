@@ -0,0 +1,314 @@
+/******************************************************************************
+ *
+ *  Project:  Universal Partial Words
+ *  Authors:  William Carey <wcarey1@gmu.edu>
+ *
+ *  Acknowledgements: The algorithm that underlies this program was developed
+ *                    by Daniel McGinnis.
+ *
+ *  Copyright (c) 2023-2025, William Carey
+ *  SPDX-License-Identifier: MIT
+ *
+ *  The depth first search from upword-memoized.py, in C. The script compiles
+ *  this with the system C compiler when it starts up and calls search()
+ *  through ctypes, so Python only has to deal with the parameters and with
+ *  writing down the upwords.
+ *
+ *  Symbols are packed the same way as in the script: the elements of the
+ *  alphabet get the codes 0, 1, ... and the wildcard gets the next code, each
+ *  in @symbol_bits bits, with the newest symbol in the lowest bits.
+ */
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+/* Called with the symbol codes of each upword we find. */
+typedef int (*upword_callback)(const unsigned char *codes, int length);
+
+/* Called whenever a word is longer than any we've seen so far (if
+ * @verbose_output is set) and every so often regardless, so Python gets a
+ * chance to notice things like Ctrl-C. */
+typedef int (*progress_callback)(long top, int length);
+
+/* A small xorshift generator for randomized walks. */
+static uint32_t nextRandom(uint32_t *state)
+{
+    uint32_t x = *state;
+    x ^= x << 13;
+    x ^= x >> 17;
+    x ^= x << 5;
+    *state = x;
+    return x;
+}
+
+/* search(), specialized for alphabets of two symbols. Rather than packed
+ * codes, a window is kept as two @window_length bit strings: @value has a 1
+ * wherever the window has the second symbol and @wild has a 1 wherever it has
+ * a wildcard. The concretizations of the window are then just value and
+ * value | wild, and those are also their own bit numbers in the bitmap of
+ * covered subwords, so finding them doesn't take a loop over the window.
+ */
+static long searchBinary(int window_length, int target_length,
+                         int first_symbol, int randomize_walk, uint32_t seed,
+                         int verbose_output, upword_callback found,
+                         progress_callback progress)
+{
+    const int wildcard = 2;
+    const uint64_t window_mask = (UINT64_C(1) << window_length) - 1;
+    const long bitmap_words = ((INT64_C(1) << window_length) + 63) / 64;
+
+    /* The stack works just like the one in search(). */
+    const long capacity = 2L * target_length;
+
+    long count = -1;
+    uint64_t *stack_value = malloc(capacity * sizeof *stack_value);
+    uint64_t *stack_wild = malloc(capacity * sizeof *stack_wild);
+    int *stack_length = malloc(capacity * sizeof *stack_length);
+    uint64_t *stack_covered = malloc(capacity * bitmap_words * sizeof *stack_covered);
+    uint64_t *covered = malloc(bitmap_words * sizeof *covered);
+    unsigned char *path = malloc(target_length);
+    if (!stack_value || !stack_wild || !stack_length || !stack_covered
+        || !covered || !path)
+        goto done;
+
+    uint32_t random_state = seed ? seed : 1;
+
+    stack_value[0] = first_symbol;
+    stack_wild[0] = 0;
+    stack_length[0] = 1;
+    memset(stack_covered, 0, bitmap_words * sizeof *stack_covered);
+    if (window_length == 1)
+        stack_covered[0] = UINT64_C(1) << first_symbol;
+    long top = 1;
+    int longest = 0;
+    uint32_t nodes = 0;
+    count = 0;
+
+    while (top > 0) {
+        top--;
+        const int length = stack_length[top];
+        const uint64_t value = stack_value[top];
+        const uint64_t wild = stack_wild[top];
+        path[length - 1] = (wild & 1) ? wildcard : (value & 1);
+        memcpy(covered, stack_covered + top * bitmap_words,
+               bitmap_words * sizeof *covered);
+
+        int report = (++nodes & 0xFFFFFF) == 0;
+        if (length > longest) {
+            longest = length;
+            report = report || verbose_output;
+        }
+        if (report && progress(top, length))
+            goto done;
+
+        /* Wildcard nodes have one child, the others have two that only
+         * differ in their last bit. Randomized walks just flip a coin for
+         * which one goes first. */
+        const int on_wildcard = length % window_length == window_length - 1;
+        const uint64_t shifted = (value << 1) & window_mask;
+        uint64_t child_wild = (wild << 1) & window_mask;
+        uint64_t children[2];
+        int num_children;
+        if (on_wildcard) {
+            child_wild |= 1;
+            children[0] = shifted;
+            num_children = 1;
+        } else {
+            const uint64_t first = randomize_walk ? nextRandom(&random_state) & 1 : 0;
+            children[0] = shifted | first;
+            children[1] = shifted | (first ^ 1);
+            num_children = 2;
+        }
+
+        for (int k = 0; k < num_children; k++) {
+            const uint64_t low = children[k];
+            const uint64_t high = low | child_wild;
+            const int full = length + 1 >= window_length;
+            if (full && (((covered[low >> 6] >> (low & 63))
+                          | (covered[high >> 6] >> (high & 63))) & 1))
+                continue;
+
+            if (length + 1 == target_length) {
+                path[length] = on_wildcard ? wildcard : (low & 1);
+                count++;
+                if (found(path, target_length))
+                    goto done;
+            } else {
+                uint64_t *child_covered = stack_covered + top * bitmap_words;
+                memcpy(child_covered, covered, bitmap_words * sizeof *covered);
+                if (full) {
+                    child_covered[low >> 6] |= UINT64_C(1) << (low & 63);
+                    child_covered[high >> 6] |= UINT64_C(1) << (high & 63);
+                }
+                stack_value[top] = low;
+                stack_wild[top] = child_wild;
+                stack_length[top] = length + 1;
+                top++;
+            }
+        }
+    }
+
+done:
+    free(stack_value);
+    free(stack_wild);
+    free(stack_length);
+    free(stack_covered);
+    free(covered);
+    free(path);
+    return count;
+}
+
+/* Searches the tree of words starting with the symbol @first_symbol for
+ * upwords for an alphabet of @alphabet_size symbols and windows of
+ * @window_length symbols. Returns the number of upwords found, or -1 if it
+ * couldn't allocate its stack. If either callback returns nonzero, the search
+ * stops early.
+ */
+long search(int alphabet_size, int window_length, int target_length,
+            int first_symbol, int randomize_walk, uint32_t seed,
+            int verbose_output, upword_callback found,
+            progress_callback progress)
+{
+    if (alphabet_size == 2)
+        return searchBinary(window_length, target_length, first_symbol,
+                            randomize_walk, seed, verbose_output, found,
+                            progress);
+
+    const int wildcard = alphabet_size;
+
+    int symbol_bits = 0;
+    while ((1 << symbol_bits) <= alphabet_size)
+        symbol_bits++;
+    const uint64_t symbol_mask = (UINT64_C(1) << symbol_bits) - 1;
+    const uint64_t window_mask = (UINT64_C(1) << (symbol_bits * window_length)) - 1;
+
+    /* Each of the alphabet_size**window_length concrete windows gets a bit in
+     * the bitmap of covered subwords, which is split up into uint64s. */
+    long num_windows = 1;
+    for (int i = 0; i < window_length; i++)
+        num_windows *= alphabet_size;
+    const long bitmap_words = (num_windows + 63) / 64;
+
+    /* Each node we pop pushes at most alphabet_size children, so the stack
+     * never holds more than that many entries per level of the tree. As in
+     * the script, entries only hold the last window of the word; the word
+     * itself lives in @path. */
+    const long capacity = (long)alphabet_size * target_length;
+
+    long count = -1;
+    uint64_t *stack_window = malloc(capacity * sizeof *stack_window);
+    int *stack_length = malloc(capacity * sizeof *stack_length);
+    uint64_t *stack_covered = malloc(capacity * bitmap_words * sizeof *stack_covered);
+    uint64_t *covered = malloc(bitmap_words * sizeof *covered);
+    unsigned char *path = malloc(target_length);
+    int *order = malloc(alphabet_size * sizeof *order);
+    long *new_indices = malloc(alphabet_size * sizeof *new_indices);
+    if (!stack_window || !stack_length || !stack_covered || !covered || !path
+        || !order || !new_indices)
+        goto done;
+
+    for (int a = 0; a < alphabet_size; a++)
+        order[a] = a;
+    uint32_t random_state = seed ? seed : 1;
+
+    stack_window[0] = first_symbol;
+    stack_length[0] = 1;
+    memset(stack_covered, 0, bitmap_words * sizeof *stack_covered);
+    /* With one symbol windows, the first symbol is already a whole window,
+     * so it covers a subword of its own. */
+    if (window_length == 1)
+        stack_covered[first_symbol >> 6] |= UINT64_C(1) << (first_symbol & 63);
+    long top = 1;
+    int longest = 0;
+    uint32_t nodes = 0;
+    count = 0;
+
+    while (top > 0) {
+        /* Pushing children will overwrite this entry, so we copy out its
+         * bitmap first. */
+        top--;
+        const int length = stack_length[top];
+        const uint64_t window = stack_window[top];
+        path[length - 1] = window & symbol_mask;
+        memcpy(covered, stack_covered + top * bitmap_words,
+               bitmap_words * sizeof *covered);
+
+        int report = (++nodes & 0xFFFFFF) == 0;
+        if (length > longest) {
+            longest = length;
+            report = report || verbose_output;
+        }
+        if (report && progress(top, length))
+            goto done;
+
+        /* If we're on a wildcard node, add that. Otherwise, add a node for
+         * each symbol in the alphabet. */
+        const int on_wildcard = length % window_length == window_length - 1;
+        const int num_children = on_wildcard ? 1 : alphabet_size;
+        if (!on_wildcard && randomize_walk) {
+            for (int i = alphabet_size - 1; i > 0; i--) {
+                int j = nextRandom(&random_state) % (i + 1);
+                int swap = order[i];
+                order[i] = order[j];
+                order[j] = swap;
+            }
+        }
+
+        for (int k = 0; k < num_children; k++) {
+            const int c = on_wildcard ? wildcard : order[k];
+            const uint64_t candidate = ((window << symbol_bits) | c) & window_mask;
+
+            /* Work out the bit of each concretization of the new window,
+             * and skip the child if any of them were already covered. */
+            int num_new = 0;
+            int repeated = 0;
+            if (length + 1 >= window_length) {
+                for (int a = 0; a < alphabet_size && !repeated; a++) {
+                    long index = 0;
+                    long place = 1;
+                    uint64_t rest = candidate;
+                    for (int i = 0; i < window_length; i++) {
+                        int symbol = rest & symbol_mask;
+                        if (symbol == wildcard)
+                            symbol = a;
+                        index += symbol * place;
+                        place *= alphabet_size;
+                        rest >>= symbol_bits;
+                    }
+                    if ((covered[index >> 6] >> (index & 63)) & 1)
+                        repeated = 1;
+                    else
+                        new_indices[num_new++] = index;
+                }
+            }
+            if (repeated)
+                continue;
+
+            if (length + 1 == target_length) {
+                path[length] = c;
+                count++;
+                if (found(path, target_length))
+                    goto done;
+            } else {
+                uint64_t *child_covered = stack_covered + top * bitmap_words;
+                memcpy(child_covered, covered, bitmap_words * sizeof *covered);
+                for (int j = 0; j < num_new; j++)
+                    child_covered[new_indices[j] >> 6] |= UINT64_C(1) << (new_indices[j] & 63);
+                stack_window[top] = candidate;
+                stack_length[top] = length + 1;
+                top++;
+            }
+        }
+    }
+
+done:
+    free(stack_window);
+    free(stack_length);
+    free(stack_covered);
+    free(covered);
+    free(path);
+    free(order);
+    free(new_indices);
+    return count;
+}